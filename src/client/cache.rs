@@ -1,13 +1,19 @@
+use crate::client::Temp;
 use flate2::Compression;
-use flate2::write::{GzDecoder, GzEncoder};
+use flate2::read::GzDecoder;
+use flate2::write::GzEncoder;
 use rmp_serde::{Deserializer, Serializer};
 use rusqlite::Connection;
 use serde::de::DeserializeOwned;
 use serde::{Deserialize, Serialize};
-use std::io::Write;
+use std::collections::HashSet;
+use std::io;
 use std::path::PathBuf;
-use time::Date;
 use time::macros::date;
+use time::{Date, Duration};
+
+/// Number of extracted temperatures to collect before writing them to the DB together
+const TEMP_BATCH_SIZE: usize = 256;
 
 pub struct ClientCache {
     db_path: PathBuf,
@@ -30,6 +36,7 @@ impl ClientCache {
         ClientCacheConnection {
             conn,
             table_name: table_name.to_string(),
+            pending_temps: Vec::new(),
         }
     }
 }
@@ -37,6 +44,8 @@ impl ClientCache {
 pub struct ClientCacheConnection {
     pub conn: Connection,
     pub table_name: String,
+    /// Extracted temperatures waiting to be written to the DB
+    pending_temps: Vec<(Date, Temp)>,
 }
 
 impl ClientCacheConnection {
@@ -60,12 +69,26 @@ impl ClientCacheConnection {
                 [],
             )
             .unwrap_or_else(|err| panic!("Unable to create table: {err}"));
+        self.conn
+            .execute(
+                &format!(
+                    "CREATE TABLE IF NOT EXISTS {}_temp (
+                        date INTEGER NOT NULL PRIMARY KEY,
+                        min REAL NOT NULL,
+                        mean REAL NOT NULL,
+                        max REAL NOT NULL
+                    )",
+                    self.table_name
+                ),
+                [],
+            )
+            .unwrap_or_else(|err| panic!("Unable to create table: {err}"));
     }
 
     /// Read a NwsResponse from the database
     pub fn read_data<R: DeserializeOwned>(&self, date: &Date) -> Option<R> {
         self.conn
-            .prepare(&format!(
+            .prepare_cached(&format!(
                 "SELECT response FROM {} WHERE date = ?1",
                 self.table_name
             ))
@@ -84,57 +107,152 @@ impl ClientCacheConnection {
             })
     }
 
+    /// Get the dates in the range [inclusive start, exclusive end) that have no response in the DB
+    pub fn missing_dates(&self, from_date: &Date, to_date: &Date) -> Vec<Date> {
+        let from_key = Self::get_key(from_date);
+        let to_key = Self::get_key(to_date);
+        let present: HashSet<i64> = self
+            .conn
+            .prepare_cached(&format!(
+                "SELECT date FROM {} WHERE date >= ?1 AND date < ?2",
+                self.table_name
+            ))
+            .unwrap_or_else(|err| panic!("Unable to find dates {from_date}-{to_date} in DB: {err}"))
+            .query_map(params![from_key, to_key], |row| row.get(0))
+            .unwrap_or_else(|err| panic!("Unable to find dates {from_date}-{to_date} in DB: {err}"))
+            .map(|x| x.unwrap_or_else(|err| panic!("Unable to read date from DB row: {err}")))
+            .collect();
+
+        let epoch = date!(1970 - 01 - 01);
+        (from_key..to_key)
+            .filter(|key| !present.contains(key))
+            .map(|key| epoch + Duration::days(key))
+            .collect()
+    }
+
     /// Write a VisualCrossingResponse to the database
     pub fn write_data<R: Serialize>(&self, date: &Date, response: &R) {
         let encoded = Self::write_blob(response);
         self.conn
-            .execute(
-                &format!(
-                    "INSERT INTO {}(date, response) VALUES (?1, ?2)",
-                    self.table_name
-                ),
-                params![Self::get_key(date), encoded],
-            )
+            .prepare_cached(&format!(
+                "INSERT INTO {}(date, response) VALUES (?1, ?2)",
+                self.table_name
+            ))
+            .unwrap_or_else(|err| panic!("Unable to prepare write for date {date}: {err}"))
+            .execute(params![Self::get_key(date), encoded])
             .unwrap_or_else(|err| {
                 panic!("Unable to write NWS data into cache for date {date}: {err}")
             });
     }
 
-    /// Read a NwsResponse from a MessagePack binary blob
-    fn read_blob<R: DeserializeOwned>(raw: Vec<u8>) -> R {
-        // decompress
-        let mut decompressed = Vec::new();
-        let mut decoder = GzDecoder::new(decompressed);
-        decoder
-            .write_all(&raw[..])
-            .unwrap_or_else(|err| panic!("Unable to decompress data: {err}"));
-        decompressed = decoder
-            .finish()
-            .unwrap_or_else(|err| panic!("Unable to decompress data: {err}"));
+    /// Write many responses, along with the temperatures extracted from each, to the database in
+    /// a single transaction, so that the DB is synced to disk once for the batch rather than once
+    /// per row
+    pub fn write_all_data<R: Serialize>(&self, responses: &[(Date, R, Temp)]) {
+        let tx = self
+            .conn
+            .unchecked_transaction()
+            .unwrap_or_else(|err| panic!("Unable to start transaction: {err}"));
+        responses.iter().for_each(|(date, response, temp)| {
+            self.write_data(date, response);
+            self.write_temp(date, temp);
+        });
+        tx.commit()
+            .unwrap_or_else(|err| panic!("Unable to commit data into cache: {err}"));
+    }
 
-        // deserialize to object
-        let mut de = Deserializer::new(&decompressed[..]);
+    /// Read the temperatures previously extracted from a response from the database
+    pub fn read_temp(&self, date: &Date) -> Option<Temp> {
+        self.conn
+            .prepare_cached(&format!(
+                "SELECT min, mean, max FROM {}_temp WHERE date = ?1",
+                self.table_name
+            ))
+            .unwrap_or_else(|err| panic!("Unable to determine if date {date} for in DB: {err}"))
+            .query_map(params![Self::get_key(date)], |row| {
+                Ok(Temp {
+                    min: row.get(0)?,
+                    mean: row.get(1)?,
+                    max: row.get(2)?,
+                })
+            })
+            .unwrap_or_else(|err| panic!("Unable to determine if date {date} for in DB: {err}"))
+            .next()
+            .map(|x| x.unwrap_or_else(|err| panic!("Unable to read temp for date {date}: {err}")))
+    }
+
+    /// Queue the temperatures extracted from a response to be written to the database, so that
+    /// later reads don't need to decode the whole response again.  Queued temperatures are written
+    /// in batches, each in a single transaction.
+    pub fn queue_temp(&mut self, date: &Date, temp: &Temp) {
+        self.pending_temps.push((*date, temp.clone()));
+        if self.pending_temps.len() >= TEMP_BATCH_SIZE {
+            self.flush_temps();
+        }
+    }
+
+    /// Write all queued temperatures to the database in a single transaction
+    pub fn flush_temps(&mut self) {
+        if self.pending_temps.is_empty() {
+            return;
+        }
+        let tx = self
+            .conn
+            .unchecked_transaction()
+            .unwrap_or_else(|err| panic!("Unable to start transaction: {err}"));
+        self.pending_temps
+            .iter()
+            .for_each(|(date, temp)| self.write_temp(date, temp));
+        tx.commit()
+            .unwrap_or_else(|err| panic!("Unable to commit temps into cache: {err}"));
+        self.pending_temps.clear();
+    }
+
+    /// Write the temperatures extracted from a response to the database
+    fn write_temp(&self, date: &Date, temp: &Temp) {
+        self.conn
+            .prepare_cached(&format!(
+                "INSERT OR REPLACE INTO {}_temp(date, min, mean, max) VALUES (?1, ?2, ?3, ?4)",
+                self.table_name
+            ))
+            .unwrap_or_else(|err| panic!("Unable to prepare write for date {date}: {err}"))
+            .execute(params![Self::get_key(date), temp.min, temp.mean, temp.max])
+            .unwrap_or_else(|err| panic!("Unable to write temp into cache for date {date}: {err}"));
+    }
+
+    /// Read a NwsResponse from a MessagePack binary blob, deserializing straight out of the
+    /// decompressor rather than decompressing into a buffer first
+    fn read_blob<R: DeserializeOwned>(raw: Vec<u8>) -> R {
+        let mut de = Deserializer::new(GzDecoder::new(&raw[..]));
         let response: R = Deserialize::deserialize(&mut de)
             .unwrap_or_else(|err| panic!("Unable to deserialize data: {err}"));
 
+        // the deserializer stops at the end of the value, so read the rest of the stream to make
+        // the decoder verify the gzip trailer's checksum
+        io::copy(&mut de.into_inner(), &mut io::sink())
+            .unwrap_or_else(|err| panic!("Unable to decompress data: {err}"));
+
         response
     }
 
-    /// Write a response to a MessagePack binary blob
+    /// Write a response to a MessagePack binary blob, serializing straight into the compressor
+    /// rather than into an intermediate buffer
     fn write_blob<R: Serialize>(response: &R) -> Vec<u8> {
-        // serialize to buffer
-        let mut obj_buf = Vec::new();
+        let mut encoder = GzEncoder::new(Vec::new(), Compression::best());
         response
-            .serialize(&mut Serializer::new(&mut obj_buf))
+            .serialize(&mut Serializer::new(&mut encoder))
             .unwrap_or_else(|err| panic!("Unable to serialize data: {err}"));
-
-        // compress buffer
-        let mut encoder = GzEncoder::new(Vec::new(), Compression::best());
-        encoder
-            .write_all(&obj_buf)
-            .unwrap_or_else(|err| panic!("Unable to compress data: {err}"));
         encoder
             .finish()
             .unwrap_or_else(|err| panic!("Unable to compress data: {err}"))
     }
 }
+
+impl Drop for ClientCacheConnection {
+    fn drop(&mut self) {
+        // don't risk a second panic while unwinding from the first
+        if !std::thread::panicking() {
+            self.flush_temps();
+        }
+    }
+}
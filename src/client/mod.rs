@@ -6,6 +6,11 @@ use time::Date;
 
 pub trait WeatherClient {
     fn get_history(&mut self, date: &Date) -> Option<Temp>;
+
+    /// Warm the cache for the range of dates [inclusive start, exclusive end), so that later calls
+    /// to get_history are served without calling the API.  Clients whose API can only serve one day
+    /// per request keep the default, which does nothing.
+    fn prefetch(&mut self, _from_date: &Date, _to_date: &Date) {}
 }
 
 #[derive(Debug, Clone)]
@@ -1,5 +1,6 @@
 use crate::client::cache::{ClientCache, ClientCacheConnection};
 use crate::client::{Temp, WeatherClient};
+use crate::dates::parse_date;
 use reqwest::StatusCode;
 use reqwest::blocking::{Client, ClientBuilder};
 use serde::{Deserialize, Serialize};
@@ -8,13 +9,55 @@ use time::macros::format_description;
 use time::{Date, OffsetDateTime};
 
 pub struct OpenMeteoClient {
-    lat: f32,
-    lon: f32,
+    /// The latitude, already formatted for use in API requests
+    lat: String,
+    /// The longitude, already formatted for use in API requests
+    lon: String,
     http_client: Client,
     cache_db: ClientCacheConnection,
+    /// The current date, as of when the client was constructed
+    today: Date,
 }
 
 const TABLE_NAME: &str = "open_meteo";
+/// Maximum number of days to request from the API in a single call
+const MAX_BATCH_DAYS: i64 = 366;
+/// The daily variables to request from the API, as a comma-separated list
+const DAILY_VARIABLES: &str = concat!(
+    "temperature_2m_mean,",
+    "temperature_2m_max,",
+    "temperature_2m_min,",
+    "weather_code,",
+    "apparent_temperature_mean,",
+    "apparent_temperature_max,",
+    "apparent_temperature_min,",
+    "sunrise,",
+    "sunset,",
+    "daylight_duration,",
+    "sunshine_duration,",
+    "precipitation_sum,",
+    "rain_sum,",
+    "snowfall_sum,",
+    "precipitation_hours,",
+    "wind_speed_10m_max,",
+    "wind_gusts_10m_max,",
+    "wind_direction_10m_dominant,",
+    "relative_humidity_2m_mean,",
+    "relative_humidity_2m_max,",
+    "relative_humidity_2m_min,",
+    "visibility_mean,",
+    "visibility_min,",
+    "visibility_max,",
+    "winddirection_10m_dominant,",
+    "wind_speed_10m_mean,",
+    "wind_speed_10m_min,",
+    "wet_bulb_temperature_2m_mean,",
+    "wet_bulb_temperature_2m_max,",
+    "wet_bulb_temperature_2m_min,",
+    "pressure_msl_mean,",
+    "pressure_msl_max,",
+    "pressure_msl_min",
+);
 
 impl OpenMeteoClient {
     pub fn new(lat: f32, lon: f32, cache: &ClientCache) -> OpenMeteoClient {
@@ -22,81 +65,42 @@ impl OpenMeteoClient {
         cache_db.init_db();
 
         OpenMeteoClient {
-            lat,
-            lon,
+            lat: lat.to_string(),
+            lon: lon.to_string(),
             http_client: ClientBuilder::new()
                 .gzip(true)
                 .build()
                 .expect("Unable to construct HTTP client"),
             cache_db,
+            today: OffsetDateTime::now_utc().date(),
         }
     }
 
-    /// Get the VisualCrossing historical data for a date straight from the API
+    /// Get the OpenMeteo historical data for the range of dates [inclusive start, inclusive end]
+    /// straight from the API
     #[allow(clippy::trivially_copy_pass_by_ref)]
-    fn get_from_api(&mut self, date: &Date) -> OpenMeteoResponse {
+    fn get_from_api(&mut self, from_date: &Date, to_date: &Date) -> OpenMeteoResponse {
+        let format = format_description!("[year]-[month]-[day]");
+        let start_date = from_date.format(&format).unwrap();
+        let end_date = to_date.format(&format).unwrap();
         let req = self
             .http_client
             .get("https://archive-api.open-meteo.com/v1/archive")
             .query(&[
-                (
-                    "start_date",
-                    date.format(&format_description!("[year]-[month]-[day]"))
-                        .unwrap(),
-                ),
-                (
-                    "end_date",
-                    date.format(&format_description!("[year]-[month]-[day]"))
-                        .unwrap(),
-                ),
-                ("latitude", self.lat.to_string()),
-                ("longitude", self.lon.to_string()),
-                (
-                    "daily",
-                    vec![
-                        "temperature_2m_mean",
-                        "temperature_2m_max",
-                        "temperature_2m_min",
-                        "weather_code",
-                        "apparent_temperature_mean",
-                        "apparent_temperature_max",
-                        "apparent_temperature_min",
-                        "sunrise",
-                        "sunset",
-                        "daylight_duration",
-                        "sunshine_duration",
-                        "precipitation_sum",
-                        "rain_sum",
-                        "snowfall_sum",
-                        "precipitation_hours",
-                        "wind_speed_10m_max",
-                        "wind_gusts_10m_max",
-                        "wind_direction_10m_dominant",
-                        "relative_humidity_2m_mean",
-                        "relative_humidity_2m_max",
-                        "relative_humidity_2m_min",
-                        "visibility_mean",
-                        "visibility_min",
-                        "visibility_max",
-                        "winddirection_10m_dominant",
-                        "wind_speed_10m_mean",
-                        "wind_speed_10m_min",
-                        "wet_bulb_temperature_2m_mean",
-                        "wet_bulb_temperature_2m_max",
-                        "wet_bulb_temperature_2m_min",
-                        "pressure_msl_mean",
-                        "pressure_msl_max",
-                        "pressure_msl_min",
-                    ]
-                    .join(","),
-                ),
-                ("timezone", "America/New_York".to_string()),
-                ("temperature_unit", "fahrenheit".to_string()),
-                ("wind_speed_unit", "mph".to_string()),
-                ("precipitation_unit", "inch".to_string()),
+                ("start_date", start_date.as_str()),
+                ("end_date", end_date.as_str()),
+                ("latitude", self.lat.as_str()),
+                ("longitude", self.lon.as_str()),
+                ("daily", DAILY_VARIABLES),
+                ("timezone", "America/New_York"),
+                ("temperature_unit", "fahrenheit"),
+                ("wind_speed_unit", "mph"),
+                ("precipitation_unit", "inch"),
             ])
             .build()
-            .unwrap_or_else(|_| panic!("Unable to construct request for date {date}"));
+            .unwrap_or_else(|_| {
+                panic!("Unable to construct request for dates {from_date}-{to_date}")
+            });
         let url = req.url().clone();
         info!("Calling OpenMeteo: {url}");
         let res = self
@@ -115,29 +119,71 @@ impl OpenMeteoClient {
 
 impl WeatherClient for OpenMeteoClient {
     fn get_history(&mut self, date: &Date) -> Option<Temp> {
-        let date_delta = (*date - OffsetDateTime::now_utc().date()).whole_days();
+        let date_delta = (*date - self.today).whole_days();
         let data = match date_delta.cmp(&0) {
             Ordering::Equal => panic!("Cannot get history for today"),
             Ordering::Greater => panic!("Cannot get history for the future"),
             Ordering::Less => {
+                if let Some(temp) = self.cache_db.read_temp(date) {
+                    return Some(temp);
+                }
+
                 let response = self.cache_db.read_data(date);
 
                 if let Some(resp) = response {
                     resp
                 } else {
-                    let response = self.get_from_api(date);
+                    let response = self.get_from_api(date, date);
                     self.cache_db.write_data(date, &response);
                     response
                 }
             }
         };
 
-        Some(Temp {
-            min: data.daily.temperature_2m_min[0],
-            max: data.daily.temperature_2m_max[0],
-            mean: data.daily.temperature_2m_mean[0],
-        })
+        let temp = data.temp();
+        self.cache_db.queue_temp(date, &temp);
+        Some(temp)
+    }
+
+    /// The archive API serves a range of days in a single request, so fetch each contiguous run of
+    /// uncached dates at once and store it in the cache one day at a time.
+    fn prefetch(&mut self, from_date: &Date, to_date: &Date) {
+        let to_date = (*to_date).min(self.today);
+        if *from_date >= to_date {
+            return;
+        }
+
+        let missing = self.cache_db.missing_dates(from_date, &to_date);
+        for (start, end) in contiguous_ranges(&missing, MAX_BATCH_DAYS) {
+            let days: Vec<(Date, OpenMeteoResponse, Temp)> = self
+                .get_from_api(&start, &end)
+                .split_days()
+                .into_iter()
+                .map(|(date, day)| {
+                    let temp = day.temp();
+                    (date, day, temp)
+                })
+                .collect();
+            self.cache_db.write_all_data(&days);
+        }
+    }
+}
+
+/// Group sorted dates into runs of consecutive days [inclusive start, inclusive end], each no
+/// longer than max_days
+fn contiguous_ranges(dates: &[Date], max_days: i64) -> Vec<(Date, Date)> {
+    let mut ranges: Vec<(Date, Date)> = Vec::new();
+    for date in dates {
+        match ranges.last_mut() {
+            Some((start, end))
+                if (*date - *end).whole_days() == 1 && (*date - *start).whole_days() < max_days =>
+            {
+                *end = *date
+            }
+            _ => ranges.push((*date, *date)),
+        }
     }
+    ranges
 }
 
 /// API responses consist of a UTF-8-encoded, JSON-formatted object.
@@ -154,7 +200,42 @@ struct OpenMeteoResponse {
     daily: Daily,
 }
 
-#[derive(Debug, Serialize, Deserialize)]
+impl OpenMeteoResponse {
+    /// Get the temperatures from a single-day response
+    fn temp(&self) -> Temp {
+        Temp {
+            min: self.daily.temperature_2m_min[0],
+            max: self.daily.temperature_2m_max[0],
+            mean: self.daily.temperature_2m_mean[0],
+        }
+    }
+
+    /// Split a response covering a range of days into one response per day, in the same shape as
+    /// the API returns for a single-day request
+    fn split_days(&self) -> Vec<(Date, OpenMeteoResponse)> {
+        (0..self.daily.time.len())
+            .map(|i| {
+                let date = parse_date(&self.daily.time[i]).unwrap_or_else(|err| {
+                    panic!("Unable to parse date {}: {err}", self.daily.time[i])
+                });
+                let response = OpenMeteoResponse {
+                    latitude: self.latitude,
+                    longitude: self.longitude,
+                    generationtime_ms: self.generationtime_ms,
+                    utc_offset_seconds: self.utc_offset_seconds,
+                    timezone: self.timezone.clone(),
+                    timezone_abbreviation: self.timezone_abbreviation.clone(),
+                    elevation: self.elevation,
+                    daily_units: self.daily_units.clone(),
+                    daily: self.daily.day(i),
+                };
+                (date, response)
+            })
+            .collect()
+    }
+}
+
+#[derive(Debug, Clone, Serialize, Deserialize)]
 struct DailyUnits {
     time: String,
     temperature_2m_mean: String,
@@ -229,3 +310,112 @@ struct Daily {
     pressure_msl_max: Vec<f32>,
     pressure_msl_min: Vec<f32>,
 }
+
+impl Daily {
+    /// Get the data for the i-th day of the range
+    fn day(&self, i: usize) -> Daily {
+        Daily {
+            time: vec![self.time[i].clone()],
+            temperature_2m_mean: vec![self.temperature_2m_mean[i]],
+            temperature_2m_max: vec![self.temperature_2m_max[i]],
+            temperature_2m_min: vec![self.temperature_2m_min[i]],
+            weather_code: vec![self.weather_code[i]],
+            apparent_temperature_mean: vec![self.apparent_temperature_mean[i]],
+            apparent_temperature_max: vec![self.apparent_temperature_max[i]],
+            apparent_temperature_min: vec![self.apparent_temperature_min[i]],
+            sunrise: vec![self.sunrise[i].clone()],
+            sunset: vec![self.sunset[i].clone()],
+            daylight_duration: vec![self.daylight_duration[i]],
+            sunshine_duration: vec![self.sunshine_duration[i]],
+            precipitation_sum: vec![self.precipitation_sum[i]],
+            rain_sum: vec![self.rain_sum[i]],
+            snowfall_sum: vec![self.snowfall_sum[i]],
+            precipitation_hours: vec![self.precipitation_hours[i]],
+            wind_speed_10m_max: vec![self.wind_speed_10m_max[i]],
+            wind_gusts_10m_max: vec![self.wind_gusts_10m_max[i]],
+            wind_direction_10m_dominant: vec![self.wind_direction_10m_dominant[i]],
+            relative_humidity_2m_mean: vec![self.relative_humidity_2m_mean[i]],
+            relative_humidity_2m_max: vec![self.relative_humidity_2m_max[i]],
+            relative_humidity_2m_min: vec![self.relative_humidity_2m_min[i]],
+            visibility_mean: vec![self.visibility_mean[i]],
+            visibility_min: vec![self.visibility_min[i]],
+            visibility_max: vec![self.visibility_max[i]],
+            winddirection_10m_dominant: vec![self.winddirection_10m_dominant[i]],
+            wind_speed_10m_mean: vec![self.wind_speed_10m_mean[i]],
+            wind_speed_10m_min: vec![self.wind_speed_10m_min[i]],
+            wet_bulb_temperature_2m_mean: vec![self.wet_bulb_temperature_2m_mean[i]],
+            wet_bulb_temperature_2m_max: vec![self.wet_bulb_temperature_2m_max[i]],
+            wet_bulb_temperature_2m_min: vec![self.wet_bulb_temperature_2m_min[i]],
+            pressure_msl_mean: vec![self.pressure_msl_mean[i]],
+            pressure_msl_max: vec![self.pressure_msl_max[i]],
+            pressure_msl_min: vec![self.pressure_msl_min[i]],
+        }
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use time::Duration;
+    use time::macros::date;
+
+    /// Get the days [inclusive start, exclusive end)
+    fn days(from_date: Date, to_date: Date) -> Vec<Date> {
+        (0..(to_date - from_date).whole_days())
+            .map(|i| from_date + Duration::days(i))
+            .collect()
+    }
+
+    #[test]
+    fn contiguous_ranges_empty() {
+        assert_eq!(contiguous_ranges(&[], MAX_BATCH_DAYS), vec![]);
+    }
+
+    #[test]
+    fn contiguous_ranges_splits_at_gaps() {
+        let mut dates = days(date!(2023 - 12 - 30), date!(2024 - 01 - 03));
+        dates.push(date!(2024 - 01 - 05));
+        dates.extend(days(date!(2024 - 01 - 07), date!(2024 - 01 - 09)));
+
+        assert_eq!(
+            contiguous_ranges(&dates, MAX_BATCH_DAYS),
+            vec![
+                (date!(2023 - 12 - 30), date!(2024 - 01 - 02)),
+                (date!(2024 - 01 - 05), date!(2024 - 01 - 05)),
+                (date!(2024 - 01 - 07), date!(2024 - 01 - 08)),
+            ]
+        );
+    }
+
+    #[test]
+    fn contiguous_ranges_splits_at_max_days() {
+        let dates = days(date!(2020 - 01 - 01), date!(2022 - 03 - 10));
+        let ranges = contiguous_ranges(&dates, MAX_BATCH_DAYS);
+
+        assert_eq!(ranges.len(), 3);
+        assert_eq!(ranges[0].0, dates[0]);
+        assert_eq!(ranges[2].1, *dates.last().unwrap());
+        for (start, end) in &ranges[..2] {
+            assert_eq!((*end - *start).whole_days() + 1, MAX_BATCH_DAYS);
+        }
+        for pair in ranges.windows(2) {
+            assert_eq!(pair[1].0, pair[0].1 + Duration::days(1));
+        }
+    }
+
+    #[test]
+    fn contiguous_ranges_splits_gapped_runs_at_max_days() {
+        let mut dates = days(date!(2024 - 01 - 01), date!(2024 - 01 - 06));
+        dates.extend(days(date!(2024 - 01 - 08), date!(2024 - 01 - 10)));
+
+        assert_eq!(
+            contiguous_ranges(&dates, 2),
+            vec![
+                (date!(2024 - 01 - 01), date!(2024 - 01 - 02)),
+                (date!(2024 - 01 - 03), date!(2024 - 01 - 04)),
+                (date!(2024 - 01 - 05), date!(2024 - 01 - 05)),
+                (date!(2024 - 01 - 08), date!(2024 - 01 - 09)),
+            ]
+        );
+    }
+}
@@ -15,6 +15,8 @@ pub struct VisualCrossingClient {
     api_key: String,
     http_client: Client,
     cache_db: ClientCacheConnection,
+    /// The current date, as of when the client was constructed
+    today: Date,
 }
 
 const TABLE_NAME: &str = "visual_crossing";
@@ -32,12 +34,18 @@ impl VisualCrossingClient {
                 .build()
                 .expect("Unable to construct HTTP client"),
             cache_db,
+            today: OffsetDateTime::now_utc().date(),
         }
     }
 
     /// Get the VisualCrossing historical data for a date straight from the API
     #[allow(clippy::trivially_copy_pass_by_ref)]
     fn get_from_api(&mut self, date: &Date) -> VisualCrossingResponse {
+        let day = date
+            .format(&format_description!("[year]-[month]-[day]"))
+            .unwrap();
+        let start_date_time = format!("{day}T00:00:00");
+        let end_date_time = format!("{day}T23:59:59");
         let req = self
             .http_client
             .get(
@@ -45,29 +53,15 @@ impl VisualCrossingClient {
             weatherdata/history",
             )
             .query(&[
-                (
-                    "startDateTime",
-                    format!(
-                        "{}T00:00:00",
-                        date.format(&format_description!("[year]-[month]-[day]"))
-                            .unwrap()
-                    ),
-                ),
-                (
-                    "endDateTime",
-                    format!(
-                        "{}T23:59:59",
-                        date.format(&format_description!("[year]-[month]-[day]"))
-                            .unwrap()
-                    ),
-                ),
-                ("location", self.my_location.clone()),
-                ("key", self.api_key.clone()),
-                ("aggregateHours", "24".to_string()),
-                ("collectStationContributions", "true".to_string()),
-                ("extendedStats", "true".to_string()),
-                ("unitGroup", "us".to_string()),
-                ("contentType", "json".to_string()),
+                ("startDateTime", start_date_time.as_str()),
+                ("endDateTime", end_date_time.as_str()),
+                ("location", self.my_location.as_str()),
+                ("key", self.api_key.as_str()),
+                ("aggregateHours", "24"),
+                ("collectStationContributions", "true"),
+                ("extendedStats", "true"),
+                ("unitGroup", "us"),
+                ("contentType", "json"),
             ])
             .build()
             .unwrap_or_else(|_| panic!("Unable to construct request for date {date}"));
@@ -90,11 +84,15 @@ impl VisualCrossingClient {
 
 impl WeatherClient for VisualCrossingClient {
     fn get_history(&mut self, date: &Date) -> Option<Temp> {
-        let date_delta = (*date - OffsetDateTime::now_utc().date()).whole_days();
+        let date_delta = (*date - self.today).whole_days();
         let data = match date_delta.cmp(&0) {
             Ordering::Equal => panic!("Cannot get history for today"),
             Ordering::Greater => panic!("Cannot get history for the future"),
             Ordering::Less => {
+                if let Some(temp) = self.cache_db.read_temp(date) {
+                    return Some(temp);
+                }
+
                 let response = self.cache_db.read_data(date);
 
                 if let Some(resp) = response {
@@ -113,11 +111,13 @@ impl WeatherClient for VisualCrossingClient {
                 if location.values.len() > 1 {
                     panic!("Found more than one datapoint for day {date}");
                 }
-                Temp {
+                let temp = Temp {
                     min: location.values[0].mint,
                     mean: location.values[0].temp,
                     max: location.values[0].maxt,
-                }
+                };
+                self.cache_db.queue_temp(date, &temp);
+                temp
             })
             .or_else(|| {
                 warn!(
@@ -0,0 +1,92 @@
+use time::macros::format_description;
+use time::{Date, Month};
+
+/// Parse an ISO date (ie, 2025-10-21).  Dates laid out exactly that way are decoded straight from
+/// their digits; anything else goes through the general parser so that errors are reported as
+/// usual.
+pub fn parse_date(date_str: &str) -> Result<Date, time::error::Parse> {
+    parse_date_bytes(date_str.as_bytes())
+}
+
+/// Parse an ISO date from raw bytes that have not been validated as UTF-8, such as a field read
+/// straight from a file.
+pub fn parse_date_bytes(raw: &[u8]) -> Result<Date, time::error::Parse> {
+    match parse_date_fast(raw) {
+        Some(date) => Ok(date),
+        None => Date::parse(
+            &String::from_utf8_lossy(raw),
+            &format_description!("[year]-[month]-[day]"),
+        ),
+    }
+}
+
+/// Decode a date in the fixed layout YYYY-MM-DD, returning None if the input is in any other
+/// layout or is not a valid date
+fn parse_date_fast(raw: &[u8]) -> Option<Date> {
+    if raw.len() != 10 || raw[4] != b'-' || raw[7] != b'-' {
+        return None;
+    }
+    let number = |digits: &[u8]| {
+        digits.iter().try_fold(0u16, |acc, c| {
+            c.is_ascii_digit().then(|| acc * 10 + u16::from(c - b'0'))
+        })
+    };
+
+    let year = number(&raw[0..4])?;
+    let month = Month::try_from(number(&raw[5..7])? as u8).ok()?;
+    let day = number(&raw[8..10])? as u8;
+    Date::from_calendar_date(i32::from(year), month, day).ok()
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use time::Duration;
+    use time::macros::date;
+
+    #[test]
+    fn parse_date_decodes_every_day() {
+        let mut date = date!(2023 - 01 - 01);
+        while date < date!(2025 - 01 - 01) {
+            assert_eq!(parse_date(&date.to_string()), Ok(date));
+            date += Duration::days(1);
+        }
+    }
+
+    #[test]
+    fn parse_date_rejects_invalid_days() {
+        for raw in [
+            "2023-02-29",
+            "2023-02-30",
+            "2023-04-31",
+            "2023-01-00",
+            "2023-13-01",
+        ] {
+            assert_eq!(parse_date_fast(raw.as_bytes()), None, "{raw}");
+            assert!(parse_date(raw).is_err(), "{raw}");
+        }
+    }
+
+    #[test]
+    fn parse_date_rejects_non_digits() {
+        for raw in [
+            "2023-0a-01",
+            "2023-01-0 ",
+            "20 3-01-01",
+            "2023/01/01",
+            "2023-+1-01",
+        ] {
+            assert_eq!(parse_date_fast(raw.as_bytes()), None, "{raw}");
+            assert!(parse_date(raw).is_err(), "{raw}");
+        }
+        assert!(parse_date_bytes(b"2023-01-\xff1").is_err());
+    }
+
+    #[test]
+    fn parse_date_rejects_wrong_lengths() {
+        for raw in ["", "2023-1-01", "2023-01-1", "2023-01-011", "02023-01-01"] {
+            assert_eq!(parse_date_fast(raw.as_bytes()), None, "{raw}");
+            assert!(parse_date(raw).is_err(), "{raw}");
+        }
+    }
+}
@@ -1,12 +1,11 @@
-use crate::measurement::Measurement;
 use crate::measurement::Measurements;
-use crate::regression::SimpleRegression;
+use crate::regression::{RawSums, SimpleRegression};
 use crate::tmpmgr::TempDataManager;
 
-use time::macros::format_description;
 use time::{Date, Duration};
 
 use crate::client::Temp;
+use std::fmt::Write;
 use std::fs::write;
 
 /// Graph all measurements against smoothed temperatures over the same timeframe
@@ -16,38 +15,20 @@ pub fn graph_all(
     mgr: &mut TempDataManager,
     loess_days: u8,
 ) {
-    let mut measurement_dates: Vec<Date> = Vec::new();
-
-    for record in &electric_data.data {
-        measurement_dates.push(record.date);
-    }
-    for record in &gas_data.data {
-        measurement_dates.push(record.date);
-    }
-    measurement_dates.sort();
-    measurement_dates.dedup();
-
-    let daily_temp_data: Vec<(Date, Temp)> =
-        TempDataManager::date_range(measurement_dates[0], *measurement_dates.last().unwrap())
-            .into_iter()
-            .filter_map(|date| mgr.get_temp(&date).clone().map(|temp| (date, temp)))
-            .collect();
-    let loess_max_temp_plot_data: (Vec<Date>, Vec<f32>) = calc_temp_series(
-        daily_temp_data
-            .iter()
-            .map(|(date, temp)| Measurement::new(*date, temp.max))
-            .collect(),
-        loess_days,
-    );
-    let loess_min_temp_plot_data: (Vec<Date>, Vec<f32>) = calc_temp_series(
-        daily_temp_data
-            .iter()
-            .map(|(date, temp)| Measurement::new(*date, temp.min))
-            .collect(),
-        loess_days,
-    );
-    let electric_plot_data = calc_measurement_series(electric_data.data);
-    let gas_plot_data = calc_measurement_series(gas_data.data);
+    // each series is sorted, so together they span from the earlier start to the later end
+    let start_date = electric_data.dates[0].min(gas_data.dates[0]);
+    let end_date = (*electric_data.dates.last().unwrap()).max(*gas_data.dates.last().unwrap());
+
+    let daily_temp_data: Vec<(Date, Temp)> = mgr.get_temps(start_date, end_date);
+    let temp_dates: Vec<Date> = daily_temp_data.iter().map(|(date, _)| *date).collect();
+    let max_temps: Vec<f32> = daily_temp_data.iter().map(|(_, temp)| temp.max).collect();
+    let min_temps: Vec<f32> = daily_temp_data.iter().map(|(_, temp)| temp.min).collect();
+    let loess_max_temp_plot_data: (Vec<Date>, Vec<f32>) =
+        calc_temp_series(&temp_dates, &max_temps, loess_days);
+    let loess_min_temp_plot_data: (Vec<Date>, Vec<f32>) =
+        calc_temp_series(&temp_dates, &min_temps, loess_days);
+    let electric_plot_data = calc_measurement_series(&electric_data.dates, &electric_data.amounts);
+    let gas_plot_data = calc_measurement_series(&gas_data.dates, &gas_data.amounts);
 
     let (loess_max_temp_dates, loess_max_temp_values) =
         to_plot(loess_max_temp_plot_data.0, loess_max_temp_plot_data.1);
@@ -132,74 +113,115 @@ pub fn graph_all(
     write("all-utilities.html", html).expect("Unable to write file");
 }
 
-/// Convert a series of measurements into points for a scatter plot
-fn calc_measurement_series(data: Vec<Measurement>) -> (Vec<Date>, Vec<f32>) {
-    let mut dates: Vec<Date> = Vec::new();
-    let mut amounts: Vec<f32> = Vec::new();
-
-    for i in 1..data.len() {
-        let prev = &data[i - 1];
-        let curr = &data[i];
+/// Convert a series of measurements into points for a scatter plot, giving the average amount
+/// used per day since the previous measurement
+fn calc_measurement_series(dates: &[Date], amounts: &[f32]) -> (Vec<Date>, Vec<f32>) {
+    let per_day: Vec<f32> = dates
+        .windows(2)
+        .zip(amounts.iter().skip(1))
+        .map(|(pair, amount)| amount / (pair[1].to_julian_day() - pair[0].to_julian_day()) as f32)
+        .collect();
 
-        dates.push(curr.date);
+    (dates.iter().skip(1).copied().collect(), per_day)
+}
 
-        let days = (curr.date - prev.date).whole_days();
-        amounts.push(curr.amount / days as f32);
+/// Convert a series of measurements, given as sorted dates and the value for each date, into
+/// smoothed points for a scatter plot
+fn calc_temp_series(dates: &[Date], values: &[f32], num_days: u8) -> (Vec<Date>, Vec<f32>) {
+    let base_date = dates[0];
+
+    // prefix_sums[i] summarizes the first i points, so any window's sums are the difference of two
+    // entries
+    let mut prefix_sums: Vec<RawSums> = Vec::with_capacity(dates.len() + 1);
+    prefix_sums.push(RawSums::default());
+    for (date, value) in dates.iter().zip(values) {
+        let sums = prefix_sums
+            .last()
+            .unwrap()
+            .add((*date - base_date).whole_days() as f64, f64::from(*value));
+        prefix_sums.push(sums);
     }
 
-    (dates, amounts)
-}
+    let mut amounts: Vec<f32> = Vec::with_capacity(dates.len());
 
-/// Convert a series of measurements into smoothed points for a scatter plot
-fn calc_temp_series(data: Vec<Measurement>, num_days: u8) -> (Vec<Date>, Vec<f32>) {
-    let base_date = data.iter().map(|r| r.date).min().unwrap();
-    let mut lower_init = 0;
+    for date in dates {
+        let lower_bound = *date - Duration::days(i64::from(num_days) / 2);
+        let upper_bound = *date + Duration::days((i64::from(num_days) - 1) / 2);
+        let lower = dates.partition_point(|d| *d < lower_bound);
+        let upper = dates.partition_point(|d| *d <= upper_bound);
+        let regression = SimpleRegression::from_sums(&(prefix_sums[upper] - prefix_sums[lower]));
 
-    let mut dates: Vec<Date> = Vec::new();
-    let mut amounts: Vec<f32> = Vec::new();
+        amounts.push(regression.predict((*date - base_date).whole_days() as f64) as f32);
+    }
 
-    for measurement in &data {
-        let lower_bound = measurement.date - Duration::days(i64::from(num_days) / 2);
-        let upper_bound = measurement.date + Duration::days((i64::from(num_days) - 1) / 2);
-        let mut regression = SimpleRegression::new();
+    (dates.to_vec(), amounts)
+}
 
-        let mut i = lower_init;
-        while (lower_bound - data[i].date).whole_days() > 0 {
-            i += 1;
-        }
-        lower_init = i;
-
-        while i < data.len() && (data[i].date - upper_bound).whole_days() <= 0 {
-            regression.add_data(
-                (data[i].date - base_date).whole_days() as f64,
-                f64::from(data[i].amount),
-            );
-            i += 1;
+/// Convert a data series into the format for putting into JS.
+fn to_plot(dates: Vec<Date>, values: Vec<f32>) -> (String, String) {
+    let mut dates_js = String::with_capacity(dates.len() * 13);
+    for date in &dates {
+        if !dates_js.is_empty() {
+            dates_js.push(',');
         }
+        // Date's Display is the ISO date (ie, 2025-10-21), written without an intermediate String
+        write!(dates_js, "\"{date}\"").unwrap();
+    }
 
-        dates.push(measurement.date);
-        amounts.push(regression.predict((measurement.date - base_date).whole_days() as f64) as f32);
+    let mut values_js = String::with_capacity(values.len() * 8);
+    for value in &values {
+        if !values_js.is_empty() {
+            values_js.push(',');
+        }
+        write!(values_js, "{value}").unwrap();
     }
 
-    (dates, amounts)
+    (dates_js, values_js)
 }
 
-/// Convert a data series into the format for putting into JS.
-fn to_plot(dates: Vec<Date>, values: Vec<f32>) -> (String, String) {
-    let dates: Vec<String> = dates
-        .iter()
-        .map(|x| {
-            x.format(&format_description!("[year]-[month]-[day]"))
-                .unwrap()
-        })
-        .collect();
-    let values: Vec<String> = values.iter().map(|x| x.to_string()).collect();
-    (
-        if !dates.is_empty() {
-            format!("\"{}\"", dates.join("\",\""))
-        } else {
-            "".to_string()
-        },
-        values.join(","),
-    )
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use time::macros::date;
+
+    #[test]
+    fn calc_temp_series_matches_regression_over_each_window() {
+        // a few years of readings with irregular gaps, like real meter readings
+        let mut dates: Vec<Date> = Vec::new();
+        let mut values: Vec<f32> = Vec::new();
+        let mut date = date!(2020 - 01 - 01);
+        for i in 0..1000i64 {
+            dates.push(date);
+            values.push(50f32 + 30f32 * (i as f32 / 20f32).sin() + (i % 7) as f32);
+            date += Duration::days(1 + (i * 7) % 5 + if i % 97 == 0 { 20 } else { 0 });
+        }
+
+        for num_days in 1..=30u8 {
+            let (series_dates, series_values) = calc_temp_series(&dates, &values, num_days);
+            assert_eq!(series_dates, dates);
+
+            for (date, actual) in dates.iter().zip(series_values) {
+                let lower_bound = *date - Duration::days(i64::from(num_days) / 2);
+                let upper_bound = *date + Duration::days((i64::from(num_days) - 1) / 2);
+                let mut regression = SimpleRegression::new();
+                dates
+                    .iter()
+                    .zip(&values)
+                    .filter(|(d, _)| lower_bound <= **d && **d <= upper_bound)
+                    .for_each(|(d, value)| {
+                        regression.add_data((*d - dates[0]).whole_days() as f64, f64::from(*value))
+                    });
+                let expected = regression.predict((*date - dates[0]).whole_days() as f64) as f32;
+
+                if expected.is_nan() {
+                    assert!(actual.is_nan(), "{date} over {num_days} days: {actual}");
+                } else {
+                    assert!(
+                        (actual - expected).abs() <= 1e-4 * expected.abs().max(1f32),
+                        "{date} over {num_days} days: {actual} != {expected}"
+                    );
+                }
+            }
+        }
+    }
 }
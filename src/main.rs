@@ -13,6 +13,7 @@ extern crate rusqlite;
 extern crate serde;
 extern crate time;
 
+mod dates;
 mod grapher;
 mod measurement;
 mod regression;
@@ -81,8 +82,8 @@ fn main() {
 
             info!(
                 "Read {} records covering {} days",
-                measurements.data.len(),
-                (measurements.data.last().unwrap().date - measurements.data[0].date).whole_days()
+                measurements.dates.len(),
+                (*measurements.dates.last().unwrap() - measurements.dates[0]).whole_days()
             );
 
             measurements
@@ -102,8 +103,8 @@ fn main() {
 
             info!(
                 "Read {} records covering {} days",
-                measurements.data.len(),
-                (measurements.data.last().unwrap().date - measurements.data[0].date).whole_days()
+                measurements.dates.len(),
+                (*measurements.dates.last().unwrap() - measurements.dates[0]).whole_days()
             );
 
             measurements
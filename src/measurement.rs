@@ -1,35 +1,23 @@
 use time::Date;
 
+use crate::dates::parse_date_bytes;
+use std::num::ParseIntError;
 use std::path::Path;
-use time::macros::format_description;
 
 /// A series of meter readings
 #[derive(Debug)]
 #[allow(dead_code)]
 pub struct Measurements {
-    /// The meter readings
-    pub data: Vec<Measurement>,
+    /// The dates of the meter readings, in ascending order
+    pub dates: Vec<Date>,
+    /// The amount of resources used since the previous meter reading, for each date in dates
+    pub amounts: Vec<f32>,
     /// The type of utility being measured (ie, Electricity)
     pub typ: String,
     /// The unit that the measurements are reported in
     pub unit: String,
 }
 
-/// A single meter reading
-#[derive(Debug)]
-pub struct Measurement {
-    /// The date of the meter reading
-    pub date: Date,
-    /// The amount of resources used since the last meter reading
-    pub amount: f32,
-}
-
-impl Measurement {
-    pub fn new(date: Date, amount: f32) -> Measurement {
-        Measurement { date, amount }
-    }
-}
-
 impl Measurements {
     /// Load a measurements object from a CSV file.
     pub fn from_file(path: &Path, typ: String, unit: String) -> Result<Measurements, ReadError> {
@@ -38,19 +26,26 @@ impl Measurements {
             .trim(csv::Trim::Fields)
             .from_path(path)?;
 
-        let mut records: Vec<Measurement> = Vec::new();
-        for result in reader.deserialize() {
-            let (date_str, value): (String, u16) = result?;
-            let date = Date::parse(&date_str, &format_description!("[year]-[month]-[day]"))?;
-            records.push(Measurement {
-                date,
-                amount: f32::from(value),
-            })
+        let mut records: Vec<(Date, f32)> = Vec::new();
+        // read raw bytes, since the fields are plain ASCII and don't need UTF-8 validation
+        let mut record = csv::ByteRecord::new();
+        while reader.read_byte_record(&mut record)? {
+            let field = |i: usize| {
+                record.get(i).ok_or_else(|| ReadError::MissingFieldError {
+                    line: record.position().map_or(0, |pos| pos.line()),
+                    field: i,
+                })
+            };
+            let date = parse_date_bytes(field(0)?)?;
+            let value: u16 = String::from_utf8_lossy(field(1)?).parse()?;
+            records.push((date, f32::from(value)))
         }
-        records.sort_by_key(|a| a.date);
+        records.sort_by_key(|(date, _)| *date);
+        let (dates, amounts) = records.into_iter().unzip();
 
         Ok(Measurements {
-            data: records,
+            dates,
+            amounts,
             typ,
             unit,
         })
@@ -62,6 +57,8 @@ impl Measurements {
 pub enum ReadError {
     CsvError { err: csv::Error },
     DateParseError { err: time::error::Parse },
+    MissingFieldError { line: u64, field: usize },
+    ValueParseError { err: ParseIntError },
 }
 
 impl From<csv::Error> for ReadError {
@@ -75,3 +72,9 @@ impl From<time::error::Parse> for ReadError {
         ReadError::DateParseError { err }
     }
 }
+
+impl From<ParseIntError> for ReadError {
+    fn from(err: ParseIntError) -> Self {
+        ReadError::ValueParseError { err }
+    }
+}
@@ -1,4 +1,52 @@
 use std::f64;
+use std::ops::Sub;
+
+/// Raw (uncentered) sums over a set of observations.  Accumulating these along a series allows the
+/// sums over any contiguous run of the series to be found with a single subtraction.
+#[derive(Debug, Clone, Copy, Default)]
+pub struct RawSums {
+    /// Number of observations
+    n: i64,
+    /// Sum of x values
+    sum_x: f64,
+    /// Sum of y values
+    sum_y: f64,
+    /// Sum of squared x values
+    sum_xx: f64,
+    /// Sum of squared y values
+    sum_yy: f64,
+    /// Sum of products
+    sum_xy: f64,
+}
+
+impl RawSums {
+    /// Get the sums with the observation (x, y) added
+    pub fn add(&self, x: f64, y: f64) -> RawSums {
+        RawSums {
+            n: self.n + 1,
+            sum_x: self.sum_x + x,
+            sum_y: self.sum_y + y,
+            sum_xx: self.sum_xx + x * x,
+            sum_yy: self.sum_yy + y * y,
+            sum_xy: self.sum_xy + x * y,
+        }
+    }
+}
+
+impl Sub for RawSums {
+    type Output = RawSums;
+
+    fn sub(self, other: RawSums) -> RawSums {
+        RawSums {
+            n: self.n - other.n,
+            sum_x: self.sum_x - other.sum_x,
+            sum_y: self.sum_y - other.sum_y,
+            sum_xx: self.sum_xx - other.sum_xx,
+            sum_yy: self.sum_yy - other.sum_yy,
+            sum_xy: self.sum_xy - other.sum_xy,
+        }
+    }
+}
 
 /// A simple linear regression calculator.  Based on Java commons-math3 3.6.1 SimpleRegression.
 pub struct SimpleRegression {
@@ -38,12 +86,32 @@ impl SimpleRegression {
         }
     }
 
+    /// Construct a regression, with an intercept, over the observations summarized by sums.
+    pub fn from_sums(sums: &RawSums) -> SimpleRegression {
+        if sums.n == 0 {
+            return SimpleRegression::new();
+        }
+        let n = sums.n as f64;
+        SimpleRegression {
+            sum_x: sums.sum_x,
+            sum_xx: sums.sum_xx - sums.sum_x * sums.sum_x / n,
+            sum_y: sums.sum_y,
+            sum_yy: sums.sum_yy - sums.sum_y * sums.sum_y / n,
+            sum_xy: sums.sum_xy - sums.sum_x * sums.sum_y / n,
+            n: sums.n,
+            x_bar: sums.sum_x / n,
+            y_bar: sums.sum_y / n,
+            has_intercept: true,
+        }
+    }
+
     /// Adds the observation (x, y) to the regression data set.
     ///
     /// Uses updating formulas for means and sums of squares defined in "Algorithms for Computing
     /// the Sample Variance: Analysis and Recommendations", Chan, T.F., Golub, G.H., and
     /// LeVeque, R.J. 1983, American Statistician, vol. 37, pp. 242-247, referenced in Weisberg, S.
     /// "Applied Linear Regression". 2nd Ed. 1985.
+    #[allow(dead_code)]
     pub fn add_data(&mut self, x: f64, y: f64) {
         if self.n == 0 {
             self.x_bar = x;
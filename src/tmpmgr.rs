@@ -1,13 +1,30 @@
 use crate::client::{Temp, WeatherClient};
 
-use time::{Date, Duration};
+use time::{Date, Duration, Month};
 
 use std::collections::HashMap;
 use std::f32;
 
+/// The temperatures for each day of a month, indexed by day of the month - 1
+struct MonthTemps {
+    temps: [Option<Temp>; 31],
+    /// Whether the temperature for each day has been loaded from the clients yet
+    loaded: [bool; 31],
+}
+
+impl MonthTemps {
+    fn new() -> MonthTemps {
+        MonthTemps {
+            temps: [const { None }; 31],
+            loaded: [false; 31],
+        }
+    }
+}
+
 pub struct TempDataManager {
     clients: Vec<Box<dyn WeatherClient>>,
-    cache: HashMap<Date, Option<Temp>>,
+    /// Cached temperatures, keyed by year and month
+    cache: HashMap<(i32, Month), MonthTemps>,
 }
 
 impl TempDataManager {
@@ -19,89 +36,146 @@ impl TempDataManager {
         }
     }
 
-    /// Generate a range of dates [inclusive start, exclusive end)
-    pub fn date_range(start_date: Date, end_date: Date) -> Vec<Date> {
-        let mut dates: Vec<Date> = Vec::new();
-        for i in 0..(end_date - start_date).whole_days() {
-            dates.push(start_date + Duration::days(i));
+    /// Warm every client's cache for the range of dates [inclusive start, exclusive end), so that
+    /// clients able to serve a range of days per API call don't have to make one call per day
+    pub fn prefetch(&mut self, from_date: &Date, to_date: &Date) {
+        self.clients
+            .iter_mut()
+            .for_each(|client| client.prefetch(from_date, to_date));
+    }
+
+    /// Get the first day of the month following the provided date
+    fn next_month(date: &Date) -> Date {
+        let (year, month) = match date.month() {
+            Month::December => (date.year() + 1, Month::January),
+            month => (date.year(), month.next()),
+        };
+        Date::from_calendar_date(year, month, 1).unwrap()
+    }
+
+    /// Get the temperature for the provided date from the clients, combining the data from all
+    /// clients that have it
+    fn fetch_temp(clients: &mut [Box<dyn WeatherClient>], date: &Date) -> Option<Temp> {
+        let temps: Vec<Option<Temp>> = clients
+            .iter_mut()
+            .map(|client| client.get_history(date))
+            .collect();
+
+        let mut min: f32 = f32::MAX;
+        let mut max: f32 = f32::MIN;
+        let mut mean_sum: f32 = 0f32;
+        let mut count: u8 = 0;
+        for temp in temps {
+            temp.iter().for_each(|t| {
+                min = min.min(t.min);
+                max = max.max(t.max);
+                mean_sum += t.mean;
+                count += 1;
+            })
+        }
+        if count > 0 {
+            Some(Temp {
+                min,
+                max,
+                mean: mean_sum / count as f32,
+            })
+        } else {
+            None
         }
-        dates
     }
 
-    /// Get the temperature for the provided date
-    pub fn get_temp(&mut self, date: &Date) -> &Option<Temp> {
-        if !self.cache.contains_key(date) {
-            let temps: Vec<Option<Temp>> = self
-                .clients
-                .iter_mut()
-                .map(|client| client.get_history(date))
-                .collect();
-
-            let mut min: f32 = f32::MAX;
-            let mut max: f32 = f32::MIN;
-            let mut mean_sum: f32 = 0f32;
-            let mut count: u8 = 0;
-            for temp in temps {
-                temp.iter().for_each(|t| {
-                    min = min.min(t.min);
-                    max = max.max(t.max);
-                    mean_sum += t.mean;
-                    count += 1;
-                })
+    /// Get the temperatures for the range of dates [inclusive start, exclusive end), which must all
+    /// fall within the same month
+    fn get_month_temps(&mut self, from_date: Date, to_date: Date) -> &[Option<Temp>] {
+        let (year, month, day) = from_date.to_calendar_date();
+        let from = usize::from(day - 1);
+        let to = from + (to_date - from_date).whole_days() as usize;
+        let month = self
+            .cache
+            .entry((year, month))
+            .or_insert_with(MonthTemps::new);
+        for day in from..to {
+            if !month.loaded[day] {
+                let date = from_date + Duration::days((day - from) as i64);
+                month.temps[day] = Self::fetch_temp(&mut self.clients, &date);
+                month.loaded[day] = true;
             }
-            let temp = if count > 0 {
-                Some(Temp {
-                    min,
-                    max,
-                    mean: mean_sum / count as f32,
-                })
-            } else {
-                None
-            };
-
-            self.cache.insert(*date, temp);
         }
-        self.cache.get(date).unwrap()
+        &month.temps[from..to]
+    }
+
+    /// Walk the range of dates [inclusive start, exclusive end) one month at a time, calling f with
+    /// the first date of each month's portion of the range and the temperatures for that portion
+    fn for_each_month(
+        &mut self,
+        from_date: Date,
+        to_date: Date,
+        mut f: impl FnMut(Date, &[Option<Temp>]),
+    ) {
+        self.prefetch(&from_date, &to_date);
+
+        let mut month_start = from_date;
+        while month_start < to_date {
+            let month_end = Self::next_month(&month_start).min(to_date);
+            f(month_start, self.get_month_temps(month_start, month_end));
+            month_start = month_end;
+        }
+    }
+
+    /// Get the temperature for each date in the range [inclusive start, exclusive end) that has
+    /// temperature data available
+    pub fn get_temps(&mut self, from_date: Date, to_date: Date) -> Vec<(Date, Temp)> {
+        let mut temps: Vec<(Date, Temp)> =
+            Vec::with_capacity((to_date - from_date).whole_days().max(0) as usize);
+        self.for_each_month(from_date, to_date, |month_start, month_temps| {
+            temps.extend(month_temps.iter().enumerate().filter_map(|(i, temp)| {
+                temp.clone()
+                    .map(|temp| (month_start + Duration::days(i as i64), temp))
+            }))
+        });
+        temps
     }
 
     /// Get the average temperature over a range of days, using each day's minimum temperature in
     /// Farenheit as the data point to average.
     #[allow(dead_code)]
     pub fn get_avg_min_temp(&mut self, from_date: Date, to_date: Date) -> f32 {
-        self.get_avg_temp(from_date, to_date, &|x: &Temp| x.min)
+        self.get_avg_temp(from_date, to_date, |x: &Temp| x.min)
     }
 
     /// Get the average temperature over a range of days, using each day's mean temperature in
     /// Farenheit as the data point to average.
     #[allow(dead_code)]
     pub fn get_avg_mean_temp(&mut self, from_date: Date, to_date: Date) -> f32 {
-        self.get_avg_temp(from_date, to_date, &|x: &Temp| x.mean)
+        self.get_avg_temp(from_date, to_date, |x: &Temp| x.mean)
     }
 
     /// Get the average temperature over a range of days, using each day's maximum temperature in
     /// Farenheit as the data point to average.
     #[allow(dead_code)]
     pub fn get_avg_max_temp(&mut self, from_date: Date, to_date: Date) -> f32 {
-        self.get_avg_temp(from_date, to_date, &|x: &Temp| x.max)
+        self.get_avg_temp(from_date, to_date, |x: &Temp| x.max)
     }
 
     /// Get the average temperature over a range of days, using each day's temp as selected by
-    /// selector as the data point to average.
+    /// selector as the data point to average.  The selector is generic rather than a trait object
+    /// so that it is inlined into the summing loop instead of being called once per day.
     #[allow(dead_code)]
     fn get_avg_temp(
         &mut self,
         from_date: Date,
         to_date: Date,
-        selector: &dyn Fn(&Temp) -> f32,
+        selector: impl Fn(&Temp) -> f32,
     ) -> f32 {
-        let temps: Vec<f32> = TempDataManager::date_range(from_date, to_date)
-            .iter()
-            .map(|date| {
-                let temp = self.get_temp(date);
-                let temp = temp.as_ref().unwrap();
-                selector(temp)
-            })
-            .collect();
-        temps.iter().sum::<f32>() / temps.len() as f32
+        let mut sum: f32 = 0f32;
+        let mut count: usize = 0;
+        self.for_each_month(from_date, to_date, |_, temps| {
+            sum += temps
+                .iter()
+                .map(|temp| selector(temp.as_ref().unwrap()))
+                .sum::<f32>();
+            count += temps.len();
+        });
+        sum / count as f32
     }
 }